@@ -4,15 +4,21 @@ def expect(value, compare):
     if value != compare:
         raise ValueError(f'expecting "{compare}", got "{value}"')
     
-class Range:
-    def __init__(self, start, len):
-        self.start = start
-        self.len = len
-
 class Almanac:
+    MAP_ORDER = [
+        'seed-to-soil',
+        'soil-to-fertilizer',
+        'fertilizer-to-water',
+        'water-to-light',
+        'light-to-temperature',
+        'temperature-to-humidity',
+        'humidity-to-location',
+    ]
+
     def __init__(self, seeds, maps):
         self.seeds = seeds
         self.maps = maps
+        self.composed = None
 
     @staticmethod
     def parseFrom(file, seedRanges = False):
@@ -64,3 +70,23 @@ class Almanac:
     
     def locationFor(self, humidity):
         return self.lookup('humidity-to-location', humidity)
+
+    def compose(self):
+        if self.composed == None:
+            composed = self.maps[Almanac.MAP_ORDER[0]]
+            for name in Almanac.MAP_ORDER[1:]:
+                composed = composed.compose(self.maps[name])
+            self.composed = composed
+        return self.composed
+
+    def locationForSeed(self, seed):
+        return self.compose()[seed]
+
+    def locationsForSeeds(self, seeds):
+        return self.compose().lookupMany(seeds)
+
+    def locationRangesFor(self, ranges):
+        return self.compose().mapRanges(ranges)
+
+    def minLocation(self):
+        return min(range.start for range in self.locationRangesFor(self.seeds))
@@ -1,3 +1,14 @@
+from bisect import bisect_right
+
+import numpy as np
+
+class Range:
+    def __init__(self, start, len):
+        self.start = start
+        self.len = len
+
+    def __str__(self):
+        return f'[{self.start}, {self.start + self.len})'
 
 class Triple:
     def __init__(self, dest, src, len):
@@ -11,6 +22,8 @@ class Triple:
 class SparseMap:
     def __init__(self, triples):
         self.triples = sorted(triples, key=lambda t: t.src)
+        self.starts = [triple.src for triple in self.triples]
+        self.arrays = None
 
     @staticmethod
     def parseFrom(file):
@@ -42,15 +55,75 @@ class SparseMap:
         return value
 
     def triple(self, key):
-        low = 0
-        high = len(self.triples) - 1
-        while low <= high:
-            mid = int((low + high) / 2)
-            triple = self.triples[mid]
-            if triple.src + triple.len - 1 < key:
-                low = mid + 1
-            elif key < triple.src:
-                high = mid - 1
-            else:
-                return triple
-        return None
\ No newline at end of file
+        i = bisect_right(self.starts, key) - 1
+        if i < 0:
+            return None
+        triple = self.triples[i]
+        if triple.src + triple.len <= key:
+            return None
+        return triple
+
+    def lookupArrays(self):
+        if self.arrays == None:
+            src = np.array([triple.src for triple in self.triples], dtype=np.int64)
+            dest = np.array([triple.dest for triple in self.triples], dtype=np.int64)
+            len = np.array([triple.len for triple in self.triples], dtype=np.int64)
+            self.arrays = (src, dest, len)
+        return self.arrays
+
+    def lookupMany(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        src, dest, len = self.lookupArrays()
+        if src.size == 0:
+            return keys.copy()
+        i = np.searchsorted(src, keys, side='right') - 1
+        found = i >= 0
+        i = np.where(found, i, 0)
+        found &= keys < src[i] + len[i]
+        return np.where(found, keys + (dest[i] - src[i]), keys)
+
+    def pieces(self, range):
+        pieces = []
+        start = range.start
+        end = range.start + range.len
+        for triple in self.triples:
+            if end <= start:
+                break
+            tripleEnd = triple.src + triple.len
+            if tripleEnd <= start:
+                continue
+            if end <= triple.src:
+                break
+            if start < triple.src:
+                #print(f'mapping gap [{start}, {triple.src}) to itself')
+                pieces.append(Triple(dest = start, src = start, len = triple.src - start))
+                start = triple.src
+            overlapEnd = min(end, tripleEnd)
+            pieces.append(Triple(dest = triple.dest + (start - triple.src), src = start, len = overlapEnd - start))
+            start = overlapEnd
+        if start < end:
+            pieces.append(Triple(dest = start, src = start, len = end - start))
+        return pieces
+
+    def mapRange(self, range):
+        return [Range(piece.dest, piece.len) for piece in self.pieces(range)]
+
+    def mapRanges(self, ranges):
+        mapped = []
+        for range in ranges:
+            mapped.extend(self.mapRange(range))
+        return mapped
+
+    def bound(self):
+        return max([triple.src + triple.len for triple in self.triples], default = 0)
+
+    def compose(self, other):
+        # the result maps key to other[self[key]]; above both bounds both maps are the identity
+        bound = max(self.bound(), other.bound())
+        triples = []
+        for piece in self.pieces(Range(0, bound)):
+            for mapped in other.pieces(Range(piece.dest, piece.len)):
+                if mapped.dest == piece.src + (mapped.src - piece.dest):
+                    continue
+                triples.append(Triple(dest = mapped.dest, src = piece.src + (mapped.src - piece.dest), len = mapped.len))
+        return SparseMap(triples)
@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 import argparse
+import multiprocessing
 import sys
 from functools import cache as memoized
+from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Tuple
 from strenum import StrEnum
 
 
@@ -19,75 +23,181 @@ class Condition(StrEnum):
             return [Condition.DAMAGED, Condition.OPERATIONAL]
         return [self]
 
+class Profile:
+    def __init__(self) -> None:
+        self.frames = 0
+        self.cacheHits = 0
+        self.prunes = 0
+
+    def __str__(self) -> str:
+        return f'frames: {self.frames}, cache hits: {self.cacheHits}, prunes: {self.prunes}'
+
+def roomNeeded(groups: List[int]) -> List[int]:
+    # minimum number of positions needed to fit groups[j:] from the start of group j
+    needed = [0] * (len(groups) + 1)
+    for j in range(len(groups) - 1, -1, -1):
+        needed[j] = groups[j] + (needed[j + 1] + 1 if j + 1 < len(groups) else 0)
+    return needed
+
 def count(
         conditions: List[Condition],
-        i: int,
+        groups: List[int]) -> int:
+    cache: Dict[Tuple[int, int, int], int] = {}
+    needed = roomNeeded(groups)
+
+    def arrangements(i: int, j: int, run: int) -> int:
+        key = (i, j, run)
+        if key in cache:
+            return cache[key]
+        if len(conditions) - i < needed[j] - run:
+            total = 0
+        elif i >= len(conditions):
+            if run > 0:
+                matched = j == len(groups) - 1 and run == groups[j]
+            else:
+                matched = j == len(groups)
+            total = 1 if matched else 0
+        else:
+            total = 0
+            for condition in conditions[i].known():
+                if condition == Condition.DAMAGED:
+                    if j >= len(groups) or run >= groups[j]:
+                        continue
+                    total += arrangements(i + 1, j, run + 1)
+                elif run > 0:
+                    if run != groups[j]:
+                        continue
+                    total += arrangements(i + 1, j + 1, 0)
+                else:
+                    total += arrangements(i + 1, j, 0)
+        cache[key] = total
+        return total
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), len(conditions) + 100))
+    return arrangements(0, 0, 0)
+
+def countTraced(
+        conditions: List[Condition],
+        groups: List[int]) -> int:
+    # same as count(), but with dump() tracing and profile counters on every frame
+    cache: Dict[Tuple[int, int, int], int] = {}
+    needed = roomNeeded(groups)
+
+    def arrangements(i: int, j: int, run: int) -> int:
+        profile.frames += 1
+        key = (i, j, run)
+        if key in cache:
+            profile.cacheHits += 1
+            return cache[key]
+        dump(conditions, i, groups, j, run, "enter")
+        if len(conditions) - i < needed[j] - run:
+            profile.prunes += 1
+            dump(conditions, i, groups, j, run, "bailing - not enough room")
+            total = 0
+        elif i >= len(conditions):
+            if run > 0:
+                matched = j == len(groups) - 1 and run == groups[j]
+            else:
+                matched = j == len(groups)
+            dump(conditions, i, groups, j, run, "match <--" if matched else "bailing - groups not matched")
+            total = 1 if matched else 0
+        else:
+            total = 0
+            for condition in conditions[i].known():
+                if condition == Condition.DAMAGED:
+                    if j >= len(groups) or run >= groups[j]:
+                        profile.prunes += 1
+                        dump(conditions, i, groups, j, run, "skipping - run too long")
+                        continue
+                    total += arrangements(i + 1, j, run + 1)
+                elif run > 0:
+                    if run != groups[j]:
+                        profile.prunes += 1
+                        dump(conditions, i, groups, j, run, "skipping - run too short")
+                        continue
+                    dump(conditions, i, groups, j, run, "recurse transition")
+                    total += arrangements(i + 1, j + 1, 0)
+                else:
+                    total += arrangements(i + 1, j, 0)
+            dump(conditions, i, groups, j, run, f'return {total}')
+        cache[key] = total
+        return total
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), len(conditions) + 100))
+    return arrangements(0, 0, 0)
+
+def unfold(
+        conditions: List[Condition],
         groups: List[int],
-        j: int) -> int:
-    dump(conditions, i, groups, j, "enter")
-    if i >= len(conditions):
-        if not all(group == 0 for group in groups):
-            dump(conditions, i, groups, j, f'bailing - {groups} not all zeros')
-            return 0
-        dump(conditions, i, groups, j, "match <--")
-        return 1
-    if any(group < 0 for group in groups):
-        dump(conditions, i, groups, j, f'bailing - {groups} has negative')
-        return 0
-    if j > len(groups):
-        dump(conditions, i, groups, j, "bailing - j >= len(groups)")
-        return 0
-    total = 0
-    saveCondition = conditions[i]
-    saveGroup = groups[j] if j < len(groups) else 0
-    for condition in conditions[i].known():
-        conditions[i] = condition
-        prevDamaged = conditions[i - 1] == Condition.DAMAGED if i > 0 else False
-        hereOperational = conditions[i] == Condition.OPERATIONAL
-        transition = prevDamaged and hereOperational
-        nextj = j + 1 if transition else j
-        if j < len(groups):
-            groups[j] = saveGroup - 1 if conditions[i] == Condition.DAMAGED else saveGroup
-        elif conditions[i] == Condition.DAMAGED:
-            dump(conditions, i, groups, j, f'skipping - {groups} has no more groups')
-            continue
-        dump(conditions, i, groups, j, f'recurse {"transition" if transition else ""}')
-        total += count(conditions, i + 1, groups, nextj)
-        conditions[i] = saveCondition
-        if j < len(groups):
-            groups[j] = saveGroup
-        dump(conditions, i, groups, j, "return")
-    return total
+        factor: int) -> Tuple[List[Condition], List[int]]:
+    unfolded = list(conditions)
+    for _ in range(factor - 1):
+        unfolded.append(Condition.UNKNOWN)
+        unfolded.extend(conditions)
+    return (unfolded, groups * factor)
 
 def dump(
         conditions: List[Condition],
         i: int,
         groups: List[int],
         j: int,
+        run: int,
         message: str):
     if args.debug:
         s = "".join(conditions)
         ps = len(s) - i - 1
         g = str(groups)
         bg = sum([len(str(g)) for g in groups[:j]]) + 2 * j
-        print(f'{s} {g} {message}')
+        print(f'{s} {g} run={run} {message}')
         print(f'{" " * i}^{" " * ps}  {" " * bg}^')
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--debug', action='store_true')
-parser.add_argument('--part2', action='store_true')
-parser.add_argument('--no-part2', action='store_false', dest='part2')
-parser.set_defaults(debug=False, part2=False)
-args = parser.parse_args()
+profile = Profile()
+solve = count
 
-for line in sys.stdin:
+def countRow(line: str) -> int:
     pieces = line.strip().split()
     conditions = [Condition(value) for value in pieces[0]]
     counts = [int(num) for num in pieces[1].split(',')]
-    if args.part2:
-        base = list(conditions)
-        for _ in range(4):
-            conditions.append(Condition.UNKNOWN)
-            conditions.extend(base)
-        counts = counts * 5
-    print(count(conditions, 0, counts, 0))
+    if args.unfold > 1:
+        (conditions, counts) = unfold(conditions, counts, args.unfold)
+    return solve(conditions, counts)
+
+def initWorker(workerArgs: argparse.Namespace):
+    global args
+    args = workerArgs
+
+def report(results: Iterator[int]):
+    total = 0
+    for result in results:
+        if not args.sum:
+            print(result, flush=args.jobs > 1)
+        total += result
+    if args.sum:
+        print(total)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--profile', action='store_true', help='print frame, cache hit and prune counts to stderr at exit')
+    parser.add_argument('--part2', action='store_true')
+    parser.add_argument('--no-part2', action='store_false', dest='part2')
+    parser.add_argument('--unfold', type=int, help='unfold factor (defaults to 5 with --part2, 1 otherwise)')
+    parser.add_argument('--jobs', type=int, help='number of worker processes (ignored with --debug or --profile)')
+    parser.add_argument('--chunk-size', type=int, dest='chunkSize', help='rows handed to a worker at a time')
+    parser.add_argument('--sum', action='store_true', help='print only the total of all rows')
+    parser.set_defaults(debug=False, profile=False, part2=False, jobs=1, chunkSize=16, sum=False)
+    args = parser.parse_args()
+    if args.unfold is None:
+        args.unfold = 5 if args.part2 else 1
+    if args.debug or args.profile:
+        solve = countTraced
+        args.jobs = 1
+
+    if args.jobs > 1:
+        with multiprocessing.Pool(args.jobs, initializer=initWorker, initargs=(args,)) as pool:
+            report(pool.imap(countRow, sys.stdin, chunksize=args.chunkSize))
+    else:
+        report(map(countRow, sys.stdin))
+
+    if args.profile:
+        print(profile, file=sys.stderr)
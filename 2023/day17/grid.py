@@ -2,9 +2,13 @@
 
 from __future__ import annotations
 import argparse
+import heapq
 import sys
+from array import array
 from typing import List
+from typing import Optional
 from typing import TextIO
+from typing import Tuple
 from enum import Enum
 
 class Direction(Enum):
@@ -13,28 +17,6 @@ class Direction(Enum):
     SOUTH = 2
     WEST = 3
 
-    def next(self, coord: Coordinate) -> Coordinate:
-        if self == Direction.NORTH:
-            return Coordinate(coord.row - 1, coord.col)
-        if self == Direction.EAST:
-            return Coordinate(coord.row, coord.col + 1)
-        if self == Direction.SOUTH:
-            return Coordinate(coord.row + 1, coord.col)
-        if self == Direction.WEST:
-            return Coordinate(coord.row, coord.col - 1)
-        raise ValueError(f'Unknown direction {self}')
-
-    def reverse(self) -> Direction:
-        if self == Direction.NORTH:
-            return Direction.SOUTH
-        if self == Direction.EAST:
-            return Direction.WEST
-        if self == Direction.SOUTH:
-            return Direction.NORTH
-        if self == Direction.WEST:
-            return Direction.EAST
-        raise ValueError(f'Unknown direction {self}')
-
     def glyph(self) -> str:
         if self == Direction.NORTH:
             return '^'
@@ -63,144 +45,199 @@ class Coordinate:
     def __repr__(self) -> str:
         return self.__str__()
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Coordinate):
-            return False
-        return repr(self) == repr(other)
-
-    def __hash__(self) -> int:
-        return hash(repr(self))
-
-class Node:
-    def __init__(self, coord: Coordinate, loss: int) -> None:
-        self.coord = coord
-        self.loss = loss
-        self.adjacent = {}
-        self.weight = None
-        self.prev = (None, None)
-
-    def sequential(self, dir: Direction) -> int:
-        # if self.coord == Coordinate(0, 3):
-        #     print('vvvvvvvvvv')
-        # print(f'sequential({self}, {dir})')
-        prev, node = self.prev
-        # print(f'prev={prev} node={node}')
-        count = 0
-        if prev == dir:
-            count = 1
-            if node is not None:
-                # print(f'recursing into {node}')
-                count += node.sequential(dir)
-        # else:
-        #     print(f'prev != dir ({prev} != {dir})')
-        # print(f'sequential({self}, {dir}) -> {count}')
-        # if self.coord == Coordinate(0, 3):
-        #     print('^^^^^^^^^^')
-        return count
+class Profile:
+    def __init__(self) -> None:
+        self.expanded = 0
+        self.pushed = 0
 
     def __str__(self) -> str:
-        return f'{self.coord}'
+        return f'expanded: {self.expanded}, pushed: {self.pushed}'
 
-    def __repr__(self) -> str:
-        return self.__str__()
+profile = Profile()
 
-    def __eq__(self, other: object) -> bool:
-        if not isinstance(other, Node):
-            return False
-        return repr(self) == repr(other)
+UNREACHED = 2 ** 31 - 1
 
-    def __hash__(self) -> int:
-        return hash(repr(self))
+# row and column steps indexed by Direction value
+ROW_STEPS = (-1, 0, 1, 0)
+COL_STEPS = (0, 1, 0, -1)
 
 class Grid:
-    def __init__(self, loss: List[List[int]]) -> None:
-        self.rows = len(loss)
-        self.cols = len(loss[0])
-        if not all(len(row) == self.cols for row in loss):
+    def __init__(self, rows: int, cols: int, loss: array) -> None:
+        # loss holds one byte per cell, row-major; cells are addressed by index row * cols + col
+        if len(loss) != rows * cols:
             raise ValueError('Grid must be rectangular')
+        self.rows = rows
+        self.cols = cols
         self.loss = loss
 
-    def inbounds(self, coord: Coordinate) -> bool:
-        return 0 <= coord.row < self.rows and 0 <= coord.col < self.cols
-
-    def minloss(self, src: Coordinate, dst: Coordinate) -> List[Direction]:
-        unvisited = [
-            Node(Coordinate(row, col), self.loss[row][col])
+    def index(self, coord: Coordinate) -> int:
+        return coord.row * self.cols + coord.col
+
+    def neighbors(self, cell: int) -> List[Tuple[int, int]]:
+        # (direction, cell) for each in-bounds neighbor, directions being Direction values
+        row, col = divmod(cell, self.cols)
+        neighbors = []
+        if row > 0:
+            neighbors.append((Direction.NORTH.value, cell - self.cols))
+        if col < self.cols - 1:
+            neighbors.append((Direction.EAST.value, cell + 1))
+        if row < self.rows - 1:
+            neighbors.append((Direction.SOUTH.value, cell + self.cols))
+        if col > 0:
+            neighbors.append((Direction.WEST.value, cell - 1))
+        return neighbors
+
+    def minloss(
+            self,
+            src: Coordinate,
+            dst: Coordinate,
+            minRun: int = 1,
+            maxRun: int = 3,
+            estimate: Optional[array] = None) -> int:
+        # a state is (cell, axis of the run that ended there), packed as cell * 2 + axis with axis being
+        # Direction value % 2; each move turns onto the other axis and runs minRun..maxRun cells, so no
+        # run length is kept; the source is seeded on both axes so the first run may go either way
+        # with an estimate array this is A*; the queue is ordered on weight + estimate, so a state is
+        # stale when its queued priority is above its best known weight plus that estimate
+        if estimate is None:
+            estimate = array('i', [0]) * len(self.loss)
+        weights = array('i', [UNREACHED]) * (len(self.loss) * 2)
+        prev = array('i', [-1]) * len(weights) if args.debug else None
+        srcCell = self.index(src)
+        dstCell = self.index(dst)
+        queue = []
+        for axis in (0, 1):
+            weights[srcCell * 2 + axis] = 0
+            heapq.heappush(queue, (estimate[srcCell], srcCell * 2 + axis))
+            profile.pushed += 1
+        while len(queue) > 0:
+            priority, state = heapq.heappop(queue)
+            weight = weights[state]
+            cell, axis = divmod(state, 2)
+            if priority > weight + estimate[cell]:
+                continue
+            profile.expanded += 1
+            if cell == dstCell and cell != srcCell:
+                if args.debug:
+                    self.showpath(prev, state)
+                return weight
+            row, col = divmod(cell, self.cols)
+            for dir in (1 - axis, 3 - axis):
+                rowStep = ROW_STEPS[dir]
+                colStep = COL_STEPS[dir]
+                nextRow = row
+                nextCol = col
+                alt = weight
+                for run in range(1, maxRun + 1):
+                    nextRow += rowStep
+                    nextCol += colStep
+                    if not (0 <= nextRow < self.rows and 0 <= nextCol < self.cols):
+                        break
+                    nextCell = nextRow * self.cols + nextCol
+                    alt += self.loss[nextCell]
+                    if run < minRun:
+                        continue
+                    nextState = nextCell * 2 + dir % 2
+                    if alt < weights[nextState]:
+                        weights[nextState] = alt
+                        if prev is not None:
+                            prev[nextState] = state
+                        heapq.heappush(queue, (alt + estimate[nextCell], nextState))
+                        profile.pushed += 1
+        raise ValueError(f'No path from {src} to {dst}')
+
+    def manhattan(self, dst: Coordinate) -> array:
+        # every move enters a cell costing at least the smallest loss on the grid
+        least = min(self.loss)
+        return array('i', [
+            (abs(dst.row - row) + abs(dst.col - col)) * least
             for row in range(self.rows)
             for col in range(self.cols)
-        ]
-        nodes = {node.coord: node for node in unvisited}
+        ])
+
+    def reverse(self, dst: Coordinate) -> array:
+        # plain Dijkstra back from dst ignoring run limits, so it never overestimates the constrained loss
+        remaining = array('i', [UNREACHED]) * len(self.loss)
+        queue = [(0, self.index(dst))]
+        while len(queue) > 0:
+            weight, cell = heapq.heappop(queue)
+            if remaining[cell] != UNREACHED:
+                continue
+            remaining[cell] = weight
+            alt = weight + self.loss[cell]
+            for _, prevCell in self.neighbors(cell):
+                if remaining[prevCell] == UNREACHED:
+                    heapq.heappush(queue, (alt, prevCell))
+        return remaining
+
+    def showpath(self, prev: array, state: int) -> None:
+        display = [str(v) for v in self.loss]
+        while prev[state] >= 0:
+            cell = state // 2
+            prevCell = prev[state] // 2
+            # each step back from a state is one straight run
+            row, col = divmod(cell, self.cols)
+            prevRow, prevCol = divmod(prevCell, self.cols)
+            if row == prevRow:
+                dir = Direction.EAST if col > prevCol else Direction.WEST
+            else:
+                dir = Direction.SOUTH if row > prevRow else Direction.NORTH
+            while cell != prevCell:
+                display[cell] = dir.glyph()
+                cell -= ROW_STEPS[dir.value] * self.cols + COL_STEPS[dir.value]
+            state = prev[state]
         for row in range(self.rows):
-            for col in range(self.cols):
-                coord = Coordinate(row, col)
-                node = nodes[coord]
-                for dir in Direction:
-                    neighbor = dir.next(coord)
-                    if self.inbounds(neighbor):
-                        neighborNode = nodes[neighbor]
-                        node.adjacent[dir] = neighborNode
-        nodes[src].weight = self.loss[src.row][src.col]
-        unvisited.sort(key=lambda node: (node.weight is None, node.weight))
-        while len(unvisited) > 0:
-            u = unvisited.pop(0)
-            print(f'visiting {u} weight={u.weight}')
-            # if u.coord == dst:
-            #     break
-            for dir in u.adjacent:
-                v = u.adjacent[dir]
-                print(f'considering {v} loss={v.loss} weight={v.weight}')
-                if v in unvisited:
-                    if u.sequential(dir.reverse()) < 3:
-                        alt = u.weight + v.loss
-                        print(f'alt={alt}')
-                        if v.weight is None or alt < v.weight:
-                            v.weight = alt
-                            v.prev = (dir.reverse(), u)
-                            print(f'setting prev of {v} to {v.prev}')
-                            t = v.prev[1]
-                            while t is not None:
-                                print(f'  and prev of {t} is {t.prev}')
-                                t = t.prev[1]
-                else:
-                    print(f'{v} already visited')
-            unvisited.sort(key=lambda node: (node.weight is None, node.weight))
-
-        for row in range(self.rows):
-            print([nodes[Coordinate(row, col)].weight for col in range(self.cols)])
+            print(''.join(display[row * self.cols:(row + 1) * self.cols]))
         print()
 
-        display = [[str(v) for v in row] for row in self.loss]
-        node = nodes[dst]
-        weight = node.weight
-        while node.coord != src:
-            prev, next = node.prev
-            display[node.coord.row][node.coord.col] = prev.reverse().glyph()
-            node = next
-        for row in display:
-            print(''.join(row))
-        print()
-        return weight
+    def __str__(self) -> str:
+        return '\n'.join(
+            ''.join(str(v) for v in self.loss[row * self.cols:(row + 1) * self.cols])
+            for row in range(self.rows)
+        )
 
     @staticmethod
     def parsefrom(file: TextIO) -> Grid:
-        content = []
+        loss = array('B')
+        rows = 0
+        cols = None
         for line in file:
-            content.append([int(ch) for ch in line.strip()])
-        return Grid(content)
+            line = line.strip()
+            if cols is None:
+                cols = len(line)
+            elif len(line) != cols:
+                raise ValueError('Grid must be rectangular')
+            loss.extend(int(ch) for ch in line)
+            rows += 1
+        return Grid(rows, cols, loss)
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--debug', action='store_true')
 parser.add_argument('--part2', action='store_true')
-parser.set_defaults(debug=False, part2=False)
+parser.add_argument('--min', type=int, dest='minRun', help='minimum moves in a direction before turning or stopping')
+parser.add_argument('--max', type=int, dest='maxRun', help='maximum moves in a direction before turning')
+parser.add_argument('--heuristic', choices=['none', 'manhattan', 'reverse'], help='A* estimate of the remaining loss')
+parser.add_argument('--profile', action='store_true', help='print expanded and pushed state counts to stderr')
+parser.set_defaults(debug=False, part2=False, heuristic='none', profile=False)
 args = parser.parse_args()
+if args.minRun is None:
+    args.minRun = 4 if args.part2 else 1
+if args.maxRun is None:
+    args.maxRun = 10 if args.part2 else 3
 
 grid = Grid.parsefrom(sys.stdin)
 
 if args.debug:
-    for row in grid.loss:
-        print(''.join(str(fixture) for fixture in row))
+    print(grid)
     print()
 
 src = Coordinate(0, 0)
 dst = Coordinate(grid.rows - 1, grid.cols - 1)
-print(grid.minloss(src, dst))
+estimate = None
+if args.heuristic == 'manhattan':
+    estimate = grid.manhattan(dst)
+elif args.heuristic == 'reverse':
+    estimate = grid.reverse(dst)
+print(grid.minloss(src, dst, args.minRun, args.maxRun, estimate))
+if args.profile:
+    print(profile, file=sys.stderr)
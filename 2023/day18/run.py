@@ -3,7 +3,9 @@
 from __future__ import annotations
 import argparse
 import sys
+from typing import List
 from typing import Optional
+import numpy as np
 from scipy.sparse import lil_matrix
 from strenum import StrEnum
 
@@ -71,6 +73,59 @@ class Coordinate:
     def __hash__(self) -> int:
         return hash(repr(self))
 
+def polygonVolume(coords: List[Coordinate]) -> int:
+    # shoelace gives the area enclosed by the trench centre line; Pick's theorem turns that into the
+    # interior cell count, and the trench cells on the boundary are added back on top
+    twiceArea = 0
+    boundary = 0
+    for a, b in zip(coords, coords[1:]):
+        twiceArea += a.row * b.col - b.row * a.col
+        boundary += abs(b.row - a.row) + abs(b.col - a.col)
+    interior = abs(twiceArea) // 2 - boundary // 2 + 1
+    return interior + boundary
+
+class CompressedGrid:
+    def __init__(self, coords: List[Coordinate]) -> None:
+        # every trench vertex row and column gets a band of its own, so each block between consecutive
+        # breakpoints is either entirely dug or entirely untouched
+        self.rowBreaks = np.unique([edge for coord in coords for edge in (coord.row, coord.row + 1)])
+        self.colBreaks = np.unique([edge for coord in coords for edge in (coord.col, coord.col + 1)])
+        nrows = len(self.rowBreaks) - 1
+        ncols = len(self.colBreaks) - 1
+        trench = np.zeros((nrows, ncols), dtype=bool)
+        crossings = np.zeros((nrows + 1, ncols), dtype=int)
+        for a, b in zip(coords, coords[1:]):
+            i0, i1 = np.searchsorted(self.rowBreaks, sorted([a.row, b.row]))
+            j0, j1 = np.searchsorted(self.colBreaks, sorted([a.col, b.col]))
+            trench[i0:i1 + 1, j0:j1 + 1] = True
+            if a.col == b.col:
+                # a vertical edge crosses the scanlines of rows [top, bottom)
+                crossings[i0, j0] += 1
+                crossings[i1, j0] -= 1
+        crossings = np.cumsum(crossings[:-1], axis=0)
+        # a block is inside when an odd number of edges cross its row strictly to the left of it
+        left = np.cumsum(crossings, axis=1) - crossings
+        self.dug = trench | (left % 2 == 1)
+
+    def volume(self) -> int:
+        heights = np.diff(self.rowBreaks)
+        widths = np.diff(self.colBreaks)
+        return int((heights[:, None] * widths[None, :])[self.dug].sum())
+
+    def render(self, width: int) -> List[str]:
+        # sample the block under the centre of each character cell; rows are halved to keep the aspect
+        top, bottom = self.rowBreaks[0], self.rowBreaks[-1]
+        left, right = self.colBreaks[0], self.colBreaks[-1]
+        width = min(width, right - left)
+        scale = (right - left) / width
+        height = max(1, min(bottom - top, int((bottom - top) / scale / 2)))
+        rows = top + ((np.arange(height) + 0.5) * (bottom - top) / height).astype(np.int64)
+        cols = left + ((np.arange(width) + 0.5) * scale).astype(np.int64)
+        i = np.searchsorted(self.rowBreaks, rows, side='right') - 1
+        j = np.searchsorted(self.colBreaks, cols, side='right') - 1
+        sample = self.dug[i[:, None], j[None, :]]
+        return [''.join('#' if v else '.' for v in row) for row in sample]
+
 class SparseGrid:
     def __init__(self, rows: int, cols: int) -> None:
         self.rows = rows
@@ -111,7 +166,9 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--verbose', action='store_true')
 parser.add_argument('--debug', action='store_true')
 parser.add_argument('--part2', action='store_true')
-parser.set_defaults(verbose=False, debug=False, part2=False)
+parser.add_argument('--method', choices=['polygon', 'compressed', 'grid'], help='how to measure the lagoon')
+parser.add_argument('--render', type=int, metavar='WIDTH', help='print a downsampled map of the lagoon')
+parser.set_defaults(verbose=False, debug=False, part2=False, method='polygon')
 args = parser.parse_args()
 
 if args.debug:
@@ -147,40 +204,52 @@ for step in plan:
 if args.debug:
     print()
 
-mn = Coordinate(0, 0)
-mx = Coordinate(0, 0)
-for coord in coords:
-    mn = Coordinate(min(mn.row, coord.row), min(mn.col, coord.col))
-    mx = Coordinate(max(mx.row, coord.row), max(mx.col, coord.col))
+if args.render is not None or args.method == 'compressed':
+    compressed = CompressedGrid(coords)
+    if args.render is not None:
+        for row in compressed.render(args.render):
+            print(row)
+        print()
 
-if args.verbose:
-    print('Building grid...')
-rows = mx.row - mn.row + 1
-cols = mx.col - mn.col + 1
-grid = SparseGrid(rows, cols)
+if args.method == 'polygon':
+    print(polygonVolume(coords))
+elif args.method == 'compressed':
+    print(compressed.volume())
+else:
+    mn = Coordinate(0, 0)
+    mx = Coordinate(0, 0)
+    for coord in coords:
+        mn = Coordinate(min(mn.row, coord.row), min(mn.col, coord.col))
+        mx = Coordinate(max(mx.row, coord.row), max(mx.col, coord.col))
+
+    if args.verbose:
+        print('Building grid...')
+    rows = mx.row - mn.row + 1
+    cols = mx.col - mn.col + 1
+    grid = SparseGrid(rows, cols)
+
+    if args.verbose:
+        print('Trenching...')
+    pos = Coordinate(-mn.row, -mn.col)
+    for step in plan:
+        (dir, dist, color) = step
+        next = dir.next(pos, dist)
+        grid.trench(pos, next)
+        pos = next
+        if args.debug:
+            print(f'After {step}: {pos}')
+            if not args.part2:
+                for row in grid.content.A:
+                    print(''.join('#' if v > 0 else '.' for v in row))
+            print()
+
+    if args.verbose:
+        print('Digging interior...')
+    grid.digInterior()
 
-if args.verbose:
-    print('Trenching...')
-pos = Coordinate(-mn.row, -mn.col)
-for step in plan:
-    (dir, dist, color) = step
-    next = dir.next(pos, dist)
-    grid.trench(pos, next)
-    pos = next
     if args.debug:
-        print(f'After {step}: {pos}')
-        if not args.part2:
-            for row in grid.content.A:
-                print(''.join('#' if v > 0 else '.' for v in row))
+        for row in grid.content.A:
+            print(''.join('#' if v > 0 else '.' for v in row))
         print()
 
-if args.verbose:
-    print('Digging interior...')
-grid.digInterior()
-
-if args.debug:
-    for row in grid.content.A:
-        print(''.join('#' if v > 0 else '.' for v in row))
-    print()
-
-print(grid.volume())
+    print(grid.volume())
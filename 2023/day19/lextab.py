@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('AERODYNAMIC', 'CLOSE_BRACE', 'COLON', 'COMMA', 'EQ', 'GT', 'LT', 'MUSICAL', 'NEWLINE', 'NUMBER', 'OPEN_BRACE', 'SHINY', 'WORD', 'XCOOL'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_WORD>[a-zA-Z]+)|(?P<t_NUMBER>\\d+)|(?P<t_NEWLINE>\\n+)|(?P<t_OPEN_BRACE>\\{)|(?P<t_CLOSE_BRACE>\\})|(?P<t_XCOOL>x)|(?P<t_MUSICAL>m)|(?P<t_AERODYNAMIC>a)|(?P<t_SHINY>s)|(?P<t_GT>>)|(?P<t_EQ>=)|(?P<t_LT><)|(?P<t_COLON>:)|(?P<t_COMMA>,)', [None, ('t_WORD', 'WORD'), ('t_NUMBER', 'NUMBER'), ('t_NEWLINE', 'NEWLINE'), (None, 'OPEN_BRACE'), (None, 'CLOSE_BRACE'), (None, 'XCOOL'), (None, 'MUSICAL'), (None, 'AERODYNAMIC'), (None, 'SHINY'), (None, 'GT'), (None, 'EQ'), (None, 'LT'), (None, 'COLON'), (None, 'COMMA')])]}
+_lexstateignore = {'INITIAL': ''}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -2,9 +2,14 @@
 
 from __future__ import annotations
 import argparse
+import re
 import sys
+from typing import Callable
+from typing import Dict
+from typing import Iterable
 from typing import Optional
 from typing import List
+from typing import Tuple
 from ply import lex
 from ply import yacc
 
@@ -16,9 +21,17 @@ parser = argparse.ArgumentParser()
 parser.add_argument('--verbose', action='store_true')
 parser.add_argument('--debug', action='store_true')
 parser.add_argument('--part2', action='store_true')
-parser.set_defaults(verbose=False, debug=False, part2=False)
+parser.add_argument('--interpret', action='store_true', help='walk the workflows instead of compiling them')
+parser.add_argument('--parser', choices=['ply', 'lines'], help='PLY grammar or hand-rolled line parser')
+parser.add_argument('--batch', action='store_true', help='load ratings into an array and classify them all at once')
+parser.set_defaults(verbose=False, debug=False, part2=False, interpret=False, parser='ply', batch=False)
 args = parser.parse_args()
 
+if args.batch:
+    # numpy is only needed to classify parts in bulk, and importing it costs more than a whole
+    # ply or lines run on the example
+    import numpy as np
+
 if args.debug:
     args.verbose = True
 
@@ -62,6 +75,8 @@ t_COMMA = r','
 GT = '>'
 LT = '<'
 
+PROPERTIES = ('x', 'm', 'a', 's')
+
 def t_WORD(t):
     r'[a-zA-Z]+'
     t.type = reserved.get(t.value, 'WORD')
@@ -205,6 +220,72 @@ def find_column(input, token):
     return (token.lexpos - line_start) + 1
 
 
+def parse_ply(text: str) -> File:
+    # load the pre-generated lextab.py and parsetab.py as-is; nothing is validated or written back
+    lexer = lex.lex(optimize=1)
+    parser = yacc.yacc(optimize=1, debug=False, write_tables=False)
+    return parser.parse(text, lexer=lexer)
+
+
+WORKFLOW_PATTERN = re.compile(r'([a-zA-Z]+)\{(.*)\}')
+RULE_PATTERN = re.compile(r'(?:([xmas])([<>])(\d+):)?([a-zA-Z]+)')
+PART_PATTERN = re.compile(r'\{(.*)\}')
+RATING_PATTERN = re.compile(r'([xmas])=(\d+)')
+
+
+def parse_lines(lines: Iterable[str]) -> File:
+    # line-oriented alternative to the PLY grammar: workflows one per line, then parts one per line
+    workflows = []
+    parts = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if line == '':
+            continue
+        if line.startswith('{'):
+            match = PART_PATTERN.fullmatch(line)
+            if match is None:
+                raise ValueError(f'Syntax error in part at line {lineno}: {line}')
+            ratings = []
+            for rating in match.group(1).split(','):
+                rating_match = RATING_PATTERN.fullmatch(rating)
+                if rating_match is None:
+                    raise ValueError(f'Syntax error in rating at line {lineno}: {rating}')
+                ratings.append(Rating(rating_match.group(1), int(rating_match.group(2))))
+            parts.append(Part(ratings))
+        else:
+            match = WORKFLOW_PATTERN.fullmatch(line)
+            if match is None or len(parts) > 0:
+                raise ValueError(f'Syntax error in workflow at line {lineno}: {line}')
+            rules = []
+            for rule in match.group(2).split(','):
+                rule_match = RULE_PATTERN.fullmatch(rule)
+                if rule_match is None:
+                    raise ValueError(f'Syntax error in rule at line {lineno}: {rule}')
+                property, operator, value, workflow_name = rule_match.groups()
+                if property is None:
+                    rules.append(Rule(workflow_name))
+                else:
+                    rules.append(Rule(workflow_name, Comparison(property, operator, int(value))))
+            workflows.append(Workflow(match.group(1), rules))
+    return File(workflows, parts)
+
+
+CANONICAL_PARTS_PATTERN = re.compile(r'(?:\{x=\d+,m=\d+,a=\d+,s=\d+\}\n)*')
+PART_PUNCTUATION = str.maketrans('{}=,xmas', '        ')
+
+
+def parse_batch(text: str) -> Tuple[List[Workflow], np.ndarray]:
+    # workflows go through the line parser; parts must each be written {x=..,m=..,a=..,s=..} so their
+    # numbers can be read straight into a PROPERTIES x N array without building Part objects
+    workflow_text, _, part_text = text.partition('\n\n')
+    workflows = parse_lines(workflow_text.splitlines()).workflows
+    part_text = part_text.strip() + '\n'
+    if CANONICAL_PARTS_PATTERN.fullmatch(part_text) is None:
+        raise ValueError('Batch parts must each be on one line, rated in x,m,a,s order')
+    ratings = np.fromstring(part_text.translate(PART_PUNCTUATION), dtype=np.int64, sep=' ')
+    return (workflows, ratings.reshape(-1, len(PROPERTIES)).T)
+
+
 class File:
     def __init__(self, workflows: List[Workflow], parts: List[Part]) -> None:
         self.workflows = workflows
@@ -253,6 +334,18 @@ class Comparison:
 class Part:
     def __init__(self, ratings: List[Rating]) -> None:
         self.ratings = ratings
+        self._values = None
+
+    def values(self) -> Tuple[int, ...]:
+        # ratings in PROPERTIES order, as indexed by compiled workflows; built on first use, since
+        # parts only need them once they are run through the compiled workflows
+        if self._values is None:
+            by_property = {rating.property: rating.value for rating in self.ratings}
+            try:
+                self._values = tuple([by_property[property] for property in PROPERTIES])
+            except KeyError as e:
+                raise ValueError(f'Part {self} has no rating for {e}') from e
+        return self._values
 
     def __str__(self) -> str:
         return f'{{{",".join([str(rating) for rating in self.ratings])}}}'
@@ -276,12 +369,43 @@ class Rating:
 class Engine:
     def __init__(self, workflows: List[Workflow]) -> None:
         self.workflows = {workflow.name: workflow for workflow in workflows}
-    
+        self.compiled = None
+
     def accept(self, part: Part) -> bool:
+        return self.compile()(part.values())
+
+    def interpret(self, part: Part) -> bool:
         workflow = IN
         while workflow != ACCEPT and workflow != REJECT:
             workflow = self.process_workflow(part, workflow)
         return workflow == ACCEPT
+
+    def compile(self) -> Callable[[Tuple[int, ...]], bool]:
+        # generate one Python function per workflow, taking a PROPERTIES-ordered tuple of ratings and
+        # calling the target workflow's function directly; the entry point is the function for IN
+        if self.compiled is None:
+            source = []
+            for workflow in self.workflows.values():
+                source.append(f'def {compiled_name(workflow.name)}(v):')
+                for rule in workflow.rules:
+                    target = compiled_target(rule.workflow)
+                    if rule.comparison is None:
+                        source.append(f'    return {target}')
+                        break
+                    comparison = rule.comparison
+                    if comparison.operator not in (GT, LT):
+                        raise ValueError(f'Unknown operator {comparison.operator}')
+                    slot = PROPERTIES.index(comparison.property)
+                    source.append(f'    if v[{slot}] {comparison.operator} {comparison.value}:')
+                    source.append(f'        return {target}')
+                else:
+                    source.append('    return False')
+            if args.debug:
+                print('\n'.join(source))
+            namespace = {}
+            exec(compile('\n'.join(source), '<workflows>', 'exec'), namespace)
+            self.compiled = namespace[compiled_name(IN)]
+        return self.compiled
     
     def process_workflow(self, part: Part, workflow_name: str) -> str:
         workflow = self.workflows[workflow_name]
@@ -302,12 +426,121 @@ class Engine:
                 raise ValueError(f'Unknown operator {comparison.operator}')
         return False
 
-lexer = lex.lex()
-parser = yacc.yacc()
-file = parser.parse(sys.stdin.read())
-engine = Engine(file.workflows)
-
-if not args.part2:
-    accepted_parts = [part for part in file.parts if engine.accept(part)]
+    def accept_batch(self, ratings: np.ndarray) -> np.ndarray:
+        # ratings is a len(PROPERTIES) x N array; parts waiting at the same workflow are routed together,
+        # each rule peeling off the columns that match it and passing the rest on to the next rule
+        accepted = np.zeros(ratings.shape[1], dtype=bool)
+        pending = {IN: [np.arange(ratings.shape[1])]}
+        while len(pending) > 0:
+            workflow_name, waiting = pending.popitem()
+            remaining = np.concatenate(waiting)
+            for rule in self.workflows[workflow_name].rules:
+                if len(remaining) == 0:
+                    break
+                if rule.comparison is None:
+                    matched = remaining
+                    remaining = remaining[:0]
+                else:
+                    comparison = rule.comparison
+                    values = ratings[PROPERTIES.index(comparison.property), remaining]
+                    if comparison.operator == GT:
+                        mask = values > comparison.value
+                    elif comparison.operator == LT:
+                        mask = values < comparison.value
+                    else:
+                        raise ValueError(f'Unknown operator {comparison.operator}')
+                    matched = remaining[mask]
+                    remaining = remaining[~mask]
+                if rule.workflow == ACCEPT:
+                    accepted[matched] = True
+                elif rule.workflow != REJECT and len(matched) > 0:
+                    pending.setdefault(rule.workflow, []).append(matched)
+        return accepted
+
+    def count_accepted(self, bounds: Dict[str, Tuple[int, int]]) -> int:
+        # each box maps a property to an inclusive (low, high) range; a comparison splits a box into
+        # the part that matches the rule and the remainder that falls through to the next rule
+        total = 0
+        boxes = [(IN, dict(bounds))]
+        while len(boxes) > 0:
+            workflow_name, box = boxes.pop()
+            if workflow_name == ACCEPT:
+                total += volume(box)
+                continue
+            if workflow_name == REJECT:
+                continue
+            for rule in self.workflows[workflow_name].rules:
+                if rule.comparison is None:
+                    boxes.append((rule.workflow, box))
+                    break
+                matched, box = split(box, rule.comparison)
+                if matched is not None:
+                    boxes.append((rule.workflow, matched))
+                if box is None:
+                    break
+        return total
+
+
+def compiled_name(workflow_name: str) -> str:
+    return f'workflow_{workflow_name}'
+
+
+def compiled_target(workflow_name: str) -> str:
+    if workflow_name == ACCEPT:
+        return 'True'
+    if workflow_name == REJECT:
+        return 'False'
+    return f'{compiled_name(workflow_name)}(v)'
+
+
+def split(
+        box: Dict[str, Tuple[int, int]],
+        comparison: Comparison) -> Tuple[Optional[Dict[str, Tuple[int, int]]], Optional[Dict[str, Tuple[int, int]]]]:
+    low, high = box[comparison.property]
+    if comparison.operator == GT:
+        matching = (max(low, comparison.value + 1), high)
+        remaining = (low, min(high, comparison.value))
+    elif comparison.operator == LT:
+        matching = (low, min(high, comparison.value - 1))
+        remaining = (max(low, comparison.value), high)
+    else:
+        raise ValueError(f'Unknown operator {comparison.operator}')
+    matched = None
+    if matching[0] <= matching[1]:
+        matched = dict(box)
+        matched[comparison.property] = matching
+    if remaining[0] > remaining[1]:
+        return (matched, None)
+    box = dict(box)
+    box[comparison.property] = remaining
+    return (matched, box)
+
+
+def volume(box: Dict[str, Tuple[int, int]]) -> int:
+    total = 1
+    for low, high in box.values():
+        total *= high - low + 1
+    return total
+
+if args.batch:
+    workflows, ratings = parse_batch(sys.stdin.read())
+    engine = Engine(workflows)
+elif args.parser == 'ply':
+    file = parse_ply(sys.stdin.read())
+    engine = Engine(file.workflows)
+else:
+    file = parse_lines(sys.stdin)
+    engine = Engine(file.workflows)
+
+if args.part2:
+    print(engine.count_accepted({property: (1, 4000) for property in PROPERTIES}))
+elif args.batch:
+    print(int(ratings[:, engine.accept_batch(ratings)].sum()))
+else:
+    if args.interpret:
+        accepted_parts = [part for part in file.parts if engine.interpret(part)]
+    else:
+        accept = engine.compile()
+        accepted_parts = [part for part in file.parts if accept(part.values())]
     ratings_total = sum([rating.value for part in accepted_parts for rating in part.ratings])
     print(ratings_total)
@@ -2,8 +2,12 @@
 
 from __future__ import annotations
 import argparse
+import math
 import sys
+from collections import deque
+from typing import Dict
 from typing import List
+from typing import TextIO
 from enum import Enum
 
 parser = argparse.ArgumentParser()
@@ -11,7 +15,11 @@ parser.add_argument('--verbose', action='store_true')
 parser.add_argument('--debug', action='store_true')
 parser.add_argument('--push-button', type=int, default=1)
 parser.add_argument('--part2', action='store_true')
-parser.set_defaults(verbose=False, debug=False, part2=False)
+parser.add_argument('--max-pushes', type=int, default=100000, help='give up looking for cycles after this many pushes')
+parser.add_argument('--trace', help='write the pulse trace to this file')
+parser.add_argument('--trace-every', type=int, default=1, help='only trace every nth pulse')
+parser.add_argument('--counts', action='store_true', help='print pulses sent and received per module')
+parser.set_defaults(verbose=False, debug=False, part2=False, counts=False)
 args = parser.parse_args()
 
 if args.debug:
@@ -25,7 +33,6 @@ FLIPFLOP = '%'
 CONJUNCTION = '&'
 
 modules = {}
-pulses = []
 
 
 class PulseType(Enum):
@@ -39,25 +46,11 @@ class PulseType(Enum):
         return self.__str__()
 
 
-class Pulse:
-    def __init__(self, sender: Module, pulse: PulseType, receiver: Module) -> None:
-        self.sender = sender
-        self.pulse = pulse
-        self.receiver = receiver
+LOW = PulseType.LOW.value
+HIGH = PulseType.HIGH.value
 
-    def __str__(self) -> str:
-        return f'{self.sender.name} -{self.pulse}-> {self.receiver.name}'
-
-    def queue(self) -> None:
-        pulses.append(self)
-
-    @staticmethod
-    def process_queued_pulses() -> None:
-        while pulses:
-            pulse = pulses.pop(0)
-            if args.verbose:
-                print(pulse)
-            pulse.receiver.receive(pulse.sender, pulse.pulse)
+# maps a byte-per-flag state onto the digits of a binary number
+BITS = bytes.maketrans(b'\x00\x01', b'01')
 
 
 class Module:
@@ -84,13 +77,6 @@ class Module:
     def upstream(self, upstream: Module) -> None:
         self.upstreams[upstream.name] = upstream
 
-    def send(self, pulse: PulseType) -> None:
-        for destination in self.destinations:
-            Pulse(self, pulse, destination).queue()
-
-    def receive(self, sender: Module, pulse: PulseType) -> None:
-        pass
-
     @staticmethod
     def parse_from(line: str) -> None:
         (name, destinations) = line.strip().split(" -> ")
@@ -105,78 +91,253 @@ class Module:
 
 
 class FlipFlop(Module):
-    def __init__(self, name: str, destinations: List[Module]) -> None:
-        super().__init__(name, destinations)
-        self.state = FlipFlop.State.OFF
-
-    class State(Enum):
-        OFF = 0
-        ON = 1
-
-        def inverse(self) -> FlipFlop.State:
-            return FlipFlop.State.ON if self == FlipFlop.State.OFF else FlipFlop.State.OFF
-
     def prefix(self) -> str:
         return FLIPFLOP
 
-    def receive(self, sender: Module, pulse: PulseType) -> None:
-        if pulse == PulseType.LOW:
-            self.toggle()
-
-    def toggle(self) -> None:
-        pulse = PulseType.HIGH if self.state == FlipFlop.State.OFF else PulseType.LOW
-        self.state = self.state.inverse()
-        self.send(pulse)
-
 
 class Conjunction(Module):
-    def __init__(self, name: str, destinations: List[Module]) -> None:
-        super().__init__(name, destinations)
-        self.last_received = {}
-
     def prefix(self) -> str:
         return CONJUNCTION
 
-    def receive(self, sender: Module, pulse: PulseType) -> None:
-        self.last_received[sender.name] = pulse
-        last_received = [self.last_received.get(
-            upstream, PulseType.LOW) for upstream in self.upstreams]
-        pulse = PulseType.LOW if all(
-            pulse == PulseType.HIGH for pulse in last_received) else PulseType.HIGH
-        self.send(pulse)
-
 
 class Broadcaster(Module):
-    def receive(self, sender: Module, pulse: PulseType) -> None:
-        self.send(pulse)
+    pass
 
 
 class Button(Module):
     def __init__(self) -> None:
         super().__init__(BUTTON, [BROADCASTER])
 
-    def push(self) -> None:
-        self.send(PulseType.LOW)
-        Pulse.process_queued_pulses()
-
 
 class Receiver(Module):
     def __init__(self, name: str) -> None:
         super().__init__(name, [])
-        self.received = False
-
-    def receive(self, sender: Module, pulse: PulseType) -> None:
-        if pulse == PulseType.LOW:
-            self.received = True
 
 
 class Unspecified(Module):
     def __init__(self, name: str) -> None:
         super().__init__(name, [])
 
-    def receive(self, sender: Module, pulse: PulseType) -> None:
+
+class Observer:
+    # notified of every pulse the network processes, and at the end of every push
+    def pulse(self, push: int, src: int, dst: int, level: int) -> None:
         pass
 
+    def pushed(self, push: int) -> None:
+        pass
+
+
+class ModuleCounter(Observer):
+    def __init__(self, names: List[str]) -> None:
+        self.names = names
+        self.sent = [[0, 0] for _ in names]
+        self.received = [[0, 0] for _ in names]
+
+    def pulse(self, push: int, src: int, dst: int, level: int) -> None:
+        self.sent[src][level] += 1
+        self.received[dst][level] += 1
+
+    def report(self) -> List[str]:
+        return [
+            f'{name}: sent {sent[LOW]} low, {sent[HIGH]} high; received {received[LOW]} low, {received[HIGH]} high'
+            for name, sent, received in zip(self.names, self.sent, self.received)
+        ]
+
+
+class Tracer(Observer):
+    # formats every nth pulse and writes a whole push's worth of lines at once
+    def __init__(self, names: List[str], stream: TextIO, every: int = 1) -> None:
+        self.names = names
+        self.stream = stream
+        self.every = every
+        self.count = 0
+        self.lines = []
+
+    def pulse(self, push: int, src: int, dst: int, level: int) -> None:
+        if self.count % self.every == 0:
+            self.lines.append(f'{self.names[src]} -{PulseType(level)}-> {self.names[dst]}\n')
+        self.count += 1
+
+    def pushed(self, push: int) -> None:
+        self.stream.write(''.join(self.lines))
+        self.lines = []
+
+
+class HighWatcher(Observer):
+    # records (push, sender) for every high pulse the watched module receives
+    def __init__(self, watched: int) -> None:
+        self.watched = watched
+        self.seen = []
+
+    def pulse(self, push: int, src: int, dst: int, level: int) -> None:
+        if dst == self.watched and level == HIGH:
+            self.seen.append((push, src))
+
+
+class Network:
+    # module kinds, decided once from the module classes so the pulse loop only compares ints
+    OTHER = 0
+    FLIPFLOP = 1
+    CONJUNCTION = 2
+    BROADCASTER = 3
+    RECEIVER = 4
+
+    def __init__(self, modules: Dict[str, Module], button: Button) -> None:
+        # modules are numbered densely; each destination is paired with the slot remembering the
+        # last pulse it sent to a conjunction, so a conjunction tracks its high inputs as a count
+        self.names = [BUTTON] + [name for name in modules]
+        index = {name: i for i, name in enumerate(self.names)}
+        everything = [button] + list(modules.values())
+        self.kinds = [Network.kind(module) for module in everything]
+        self.destinations = []
+        slots = 0
+        for module in everything:
+            destinations = []
+            for destination in module.destinations:
+                if isinstance(destination, Conjunction):
+                    destinations.append((index[destination.name], slots))
+                    slots += 1
+                else:
+                    destinations.append((index[destination.name], -1))
+            self.destinations.append(tuple(destinations))
+        self.flipflops = bytearray(len(everything))
+        self.remembered = bytearray(slots)
+        self.high_inputs = [0] * len(everything)
+        self.inputs = [len(module.upstreams) for module in everything]
+        self.button = index[BUTTON]
+        self.broadcaster = index[BROADCASTER]
+        self.index = index
+        self.received = False
+        self.pushes = 0
+        self.pulses = [0, 0]
+        self.observers = []
+
+    @staticmethod
+    def kind(module: Module) -> int:
+        if isinstance(module, FlipFlop):
+            return Network.FLIPFLOP
+        if isinstance(module, Conjunction):
+            return Network.CONJUNCTION
+        if isinstance(module, Broadcaster):
+            return Network.BROADCASTER
+        if isinstance(module, Receiver):
+            return Network.RECEIVER
+        return Network.OTHER
+
+    def push(self) -> None:
+        kinds = self.kinds
+        destinations = self.destinations
+        flipflops = self.flipflops
+        remembered = self.remembered
+        high_inputs = self.high_inputs
+        inputs = self.inputs
+        pulses = self.pulses
+        observers = self.observers
+        self.pushes += 1
+        push = self.pushes
+        queue = deque([(self.button, self.broadcaster, -1, LOW)])
+        while queue:
+            src, dst, slot, level = queue.popleft()
+            pulses[level] += 1
+            if observers:
+                for observer in observers:
+                    observer.pulse(push, src, dst, level)
+            kind = kinds[dst]
+            if kind == Network.FLIPFLOP:
+                if level == HIGH:
+                    continue
+                level = flipflops[dst] ^ 1
+                flipflops[dst] = level
+            elif kind == Network.CONJUNCTION:
+                if remembered[slot] != level:
+                    remembered[slot] = level
+                    high_inputs[dst] += 1 if level == HIGH else -1
+                level = LOW if high_inputs[dst] == inputs[dst] else HIGH
+            elif kind == Network.RECEIVER:
+                if level == LOW:
+                    self.received = True
+                continue
+            elif kind != Network.BROADCASTER:
+                continue
+            for next, next_slot in destinations[dst]:
+                queue.append((dst, next, next_slot, level))
+        for observer in observers:
+            observer.pushed(push)
+
+    def snapshot(self) -> int:
+        # every flip-flop state and remembered conjunction input, one bit each
+        return int((bytes(self.flipflops) + bytes(self.remembered)).translate(BITS), 2)
+
+    def push_many(self, count: int, max_pushes: int) -> None:
+        # once the whole state repeats, the pulses sent over each further cycle repeat too, so
+        # whole cycles are skipped by scaling the counts and only the remainder is simulated; observers
+        # expect to see every pulse, so nothing is skipped while any are attached, and past max_pushes
+        # states stop being recorded so memory stays bounded
+        if self.observers:
+            for _ in range(count):
+                self.push()
+            return
+        seen = {self.snapshot(): 0}
+        history = [list(self.pulses)]
+        pushed = 0
+        while pushed < min(count, max_pushes):
+            self.push()
+            pushed += 1
+            history.append(list(self.pulses))
+            state = self.snapshot()
+            if state not in seen:
+                seen[state] = pushed
+                continue
+            start = seen[state]
+            period = pushed - start
+            cycles = (count - pushed) // period
+            if args.debug:
+                print(f'state after push {pushed} repeats push {start}, skipping {cycles} cycles of {period}')
+            for level in (LOW, HIGH):
+                self.pulses[level] += cycles * (history[pushed][level] - history[start][level])
+            self.pushes += cycles * period
+            for _ in range((count - pushed) % period):
+                self.push()
+            return
+        if pushed < count and args.debug:
+            print(f'no repeated state within {max_pushes} pushes, pushing the remaining {count - pushed}')
+        del seen, history
+        for _ in range(count - pushed):
+            self.push()
+
+    def first_low_to_receiver(self, receiver: Module, max_pushes: int) -> int:
+        # the receiver hangs off a single conjunction, which sends it low once all of the
+        # conjunction's inputs are high in the same push; each input is assumed to go high
+        # periodically from the start, so the answer is the lcm of their periods
+        if len(receiver.upstreams) != 1:
+            raise ValueError(f'{receiver.name} must have exactly one upstream')
+        feeder = next(iter(receiver.upstreams.values()))
+        if not isinstance(feeder, Conjunction):
+            raise ValueError(f'{feeder.name} feeding {receiver.name} must be a conjunction')
+        watcher = HighWatcher(self.index[feeder.name])
+        self.observers.append(watcher)
+        inputs = {self.index[name]: name for name in feeder.upstreams}
+        seen = {src: [] for src in inputs}
+        while any(len(pushes) < 2 for pushes in seen.values()):
+            if self.pushes >= max_pushes:
+                raise ValueError(f'No cycles for all of {", ".join(inputs.values())} within {max_pushes} pushes')
+            self.push()
+            for push, src in watcher.seen:
+                if len(seen[src]) == 0 or seen[src][-1] != push:
+                    seen[src].append(push)
+            watcher.seen = []
+        self.observers.remove(watcher)
+        periods = []
+        for src, pushes in seen.items():
+            first, second = pushes[:2]
+            if args.verbose:
+                print(f'{inputs[src]} sends high at pushes {first}, {second}')
+            if second - first != first:
+                raise ValueError(f'{inputs[src]} first goes high at push {first} but repeats every {second - first}')
+            periods.append(first)
+        return math.lcm(*periods)
+
 
 for line in sys.stdin:
     module = Module.parse_from(line)
@@ -184,15 +345,33 @@ for line in sys.stdin:
 
 if args.part2:
     receiver = Receiver(RECEIVER)
-    modules[RECEIVER] = Receiver(RECEIVER)
+    modules[RECEIVER] = receiver
 
 for module in list(modules.values()):
     module.link()
 
 button = Button()
 button.link()
+network = Network(modules, button)
+
+if args.verbose:
+    network.observers.append(Tracer(network.names, sys.stdout, args.trace_every))
+if args.trace is not None:
+    trace = open(args.trace, 'w', encoding='utf-8')
+    network.observers.append(Tracer(network.names, trace, args.trace_every))
+if args.counts:
+    counter = ModuleCounter(network.names)
+    network.observers.append(counter)
 
 if not args.part2:
-    args.verbose = True
-    for _ in range(args.push_button):
-        button.push()
+    network.push_many(args.push_button, args.max_pushes)
+    low, high = network.pulses
+    print(f'low: {low}, high: {high}, product: {low * high}')
+else:
+    print(network.first_low_to_receiver(receiver, args.max_pushes))
+
+if args.counts:
+    for line in counter.report():
+        print(line)
+if args.trace is not None:
+    trace.close()
@@ -3,15 +3,19 @@
 from __future__ import annotations
 import argparse
 import sys
-from typing import Callable, List, TextIO
+from bisect import bisect_right
+from collections import deque
+from typing import Callable, Iterable, List, Optional, TextIO
 from enum import Enum
 from strenum import StrEnum
 
 parser = argparse.ArgumentParser()
-parser.add_argument('--debug', action='store_true')
+parser.add_argument('--debug', action='store_true', help='print the plots after every step; without --part2 this implies --simulate')
 parser.add_argument('--part2', action='store_true')
-parser.add_argument('--steps', type=int, default=1)
-parser.set_defaults(debug=False, part2=False)
+parser.add_argument('--steps', type=int, nargs='+', default=[1])
+parser.add_argument('--exact', action='store_true', help='with --part2, search the tiling out to every step instead of extrapolating')
+parser.add_argument('--simulate', action='store_true', help='step every plot forward instead of counting from distances')
+parser.set_defaults(debug=False, part2=False, exact=False, simulate=False)
 args = parser.parse_args()
 
 class Content(StrEnum):
@@ -118,27 +122,157 @@ class Grid:
             content.append([convert(c) for c in line])
         return Grid(content)
 
-    def advance(self) -> Grid:
-        content = [list(row) for row in self._content]
-        for row in range(self.rows):
-            for col in range(self.cols):
-                if self[row][col] == Content.START or self[row][col] == Content.PLOT:
-                    coord = Coordinate(row, col)
-                    content[row][col] = Content.EMPTY
-                    for direction in Direction:
-                        next = direction.next(coord)
-                        if self[next.row][next.col] != Content.WALL:
-                            content[next.row][next.col] = Content.PLOT
+    def distances(self, start: Coordinate) -> List[List[Optional[int]]]:
+        # breadth-first from start; None marks walls and plots that can never be reached
+        distances = [[None] * self.cols for _ in range(self.rows)]
+        distances[start.row][start.col] = 0
+        frontier = deque([start])
+        while frontier:
+            coord = frontier.popleft()
+            distance = distances[coord.row][coord.col] + 1
+            for direction in Direction:
+                next = direction.next(coord)
+                if not (0 <= next.row < self.rows and 0 <= next.col < self.cols):
+                    continue
+                if self[next.row][next.col] == Content.WALL or distances[next.row][next.col] is not None:
+                    continue
+                distances[next.row][next.col] = distance
+                frontier.append(next)
+        return distances
+
+    def tiled_distances(self, start: Coordinate, limit: int) -> List[int]:
+        # breadth-first over the grid repeated infinitely in every direction, out to limit steps
+        distances = {(start.row, start.col): 0}
+        frontier = [(start.row, start.col)]
+        for distance in range(1, limit + 1):
+            next_frontier = []
+            for row, col in frontier:
+                for next in ((row - 1, col), (row, col + 1), (row + 1, col), (row, col - 1)):
+                    if next in distances or self[next[0] % self.rows][next[1] % self.cols] == Content.WALL:
+                        continue
+                    distances[next] = distance
+                    next_frontier.append(next)
+            frontier = next_frontier
+        return list(distances.values())
+
+    def tiled(self, copies: int) -> Grid:
+        # copies x copies of the grid, keeping the start only in the centre copy
+        centre = copies // 2
+        content = []
+        for tile_row in range(copies):
+            for row in self._content:
+                line = []
+                for tile_col in range(copies):
+                    if (tile_row, tile_col) == (centre, centre):
+                        line.extend(row)
+                    else:
+                        line.extend(Content.EMPTY if c == Content.START else c for c in row)
+                content.append(line)
+        return Grid(content)
+
+class StepSimulator:
+    def __init__(self, grid: Grid, start: Coordinate) -> None:
+        # the whole grid is one big int, cell (row, col) at bit row * stride + col; the spare bit at
+        # the end of each row stays clear so shifting by one never carries into the next row
+        self.grid = grid
+        self.stride = grid.cols + 1
+        self.open = int(''.join(
+            '0' + ''.join('0' if c == Content.WALL else '1' for c in reversed(grid[row]))
+            for row in reversed(range(grid.rows))
+        ), 2)
+        self.plots = 1 << (start.row * self.stride + start.col)
+
+    def advance(self) -> None:
+        plots = self.plots
+        self.plots = ((plots << 1) | (plots >> 1) | (plots << self.stride) | (plots >> self.stride)) & self.open
+
+    def count(self) -> int:
+        return self.plots.bit_count()
+
+    def render(self) -> Grid:
+        bits = format(self.plots, f'0{self.grid.rows * self.stride}b')[::-1]
+        content = []
+        for row in range(self.grid.rows):
+            line = []
+            for col in range(self.grid.cols):
+                if bits[row * self.stride + col] == '1':
+                    line.append(Content.PLOT)
+                elif self.grid[row][col] == Content.WALL:
+                    line.append(Content.WALL)
+                else:
+                    line.append(Content.EMPTY)
+            content.append(line)
         return Grid(content)
 
+class StepCounter:
+    def __init__(self, distances: Iterable[int]) -> None:
+        # a plot reachable in d steps is also reachable in d + 2, d + 4, ... by stepping back and
+        # forth, so after n steps the plots are those with d <= n and d of the same parity as n
+        self.by_parity = ([], [])
+        for distance in distances:
+            self.by_parity[distance % 2].append(distance)
+        for distances in self.by_parity:
+            distances.sort()
+
+    def count(self, steps: int) -> int:
+        return bisect_right(self.by_parity[steps % 2], steps)
+
+def extrapolate(map: Grid, start: Coordinate, steps: int) -> int:
+    # on a square tiling the count at offset + k * size steps grows quadratically in k once the
+    # frontier is crossing whole tiles, so three exact samples fix the quadratic and a fourth checks it
+    if map.rows != map.cols:
+        raise ValueError('extrapolation needs a square grid')
+    size = map.rows
+    tiles, offset = divmod(steps, size)
+    samples = [offset + k * size for k in range(4)]
+    counter = StepCounter(map.tiled_distances(start, samples[-1]))
+    if steps <= samples[-1]:
+        return counter.count(steps)
+    f0, f1, f2, f3 = [counter.count(sample) for sample in samples]
+    if args.debug:
+        print(f'{samples} steps reach {[f0, f1, f2, f3]} plots')
+    quadratic = lambda k: f0 + k * (f1 - f0) + k * (k - 1) // 2 * (f2 - 2 * f1 + f0)
+    if quadratic(3) != f3:
+        raise ValueError(f'Plot counts {[f0, f1, f2, f3]} are not quadratic in whole tiles; use --exact')
+    return quadratic(tiles)
+
+def simulate(map: Grid, start: Coordinate, steps: List[int]) -> List[int]:
+    simulator = StepSimulator(map, start)
+    counts = {0: simulator.count()}
+    for step in range(1, max(steps) + 1):
+        simulator.advance()
+        if args.debug:
+            print(simulator.render())
+        if step in steps:
+            counts[step] = simulator.count()
+    return [counts[step] for step in steps]
+
 map = Grid.parsefrom(sys.stdin, Content)
+start = map.find_only(Content.START)
 if args.debug:
     print(map)
 
-for _ in range(args.steps):
-    map = map.advance()
-    if args.debug:
-        print(map)
-
-if not args.part2:
-    print(len(map.find_all(Content.PLOT)))
+if (args.simulate or args.debug) and not args.part2:
+    # only the simulator has the plots of each step to print
+    for count in simulate(map, start, args.steps):
+        print(count)
+elif args.simulate:
+    # enough copies that the frontier never reaches the edge of the tiling
+    copies = 2 * (max(args.steps) // min(map.rows, map.cols) + 1) + 1
+    tiled = map.tiled(copies)
+    centre = copies // 2
+    tiled_start = Coordinate(centre * map.rows + start.row, centre * map.cols + start.col)
+    for count in simulate(tiled, tiled_start, args.steps):
+        print(count)
+elif not args.part2:
+    counter = StepCounter(
+        distance for row in map.distances(start) for distance in row if distance is not None)
+    for steps in args.steps:
+        print(counter.count(steps))
+elif args.exact:
+    counter = StepCounter(map.tiled_distances(start, max(args.steps)))
+    for steps in args.steps:
+        print(counter.count(steps))
+else:
+    for steps in args.steps:
+        print(extrapolate(map, start, steps))
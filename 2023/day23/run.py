@@ -2,20 +2,12 @@
 
 from __future__ import annotations
 import argparse
+import multiprocessing
 import sys
-from typing import Callable, Optional, List, TextIO
+from typing import Callable, Optional, List, TextIO, Tuple
 from enum import Enum
 from strenum import StrEnum
 
-parser = argparse.ArgumentParser()
-parser.add_argument('--debug', action='store_true')
-parser.add_argument('--verbose', action='store_true')
-parser.add_argument('--part2', action='store_true')
-parser.add_argument('--steps', type=int, default=1)
-parser.set_defaults(debug=False, verbose=False, part2=False)
-args = parser.parse_args()
-
-
 class Coordinate:
     def __init__(self, row: int, col: int) -> None:
         self.row = row
@@ -59,12 +51,6 @@ class Direction(Enum):
     def __repr__(self) -> str:
         return self.__str__()
 
-    @staticmethod
-    def values(starting_with: Optional[Direction] = None) -> List[Direction]:
-        if starting_with is None:
-            return list(Direction)
-        return list(Direction)[starting_with.value:]
-
     def reverse(self) -> Direction:
         if self == Direction.NORTH:
             return Direction.SOUTH
@@ -76,15 +62,6 @@ class Direction(Enum):
             return Direction.EAST
         return None
 
-    def succ(self) -> Direction:
-        if self == Direction.NORTH:
-            return Direction.EAST
-        if self == Direction.EAST:
-            return Direction.SOUTH
-        if self == Direction.SOUTH:
-            return Direction.WEST
-        return None
-
 
 class Content(StrEnum):
     EMPTY = '.'
@@ -167,64 +144,272 @@ class Grid:
         return 0 <= coord.row < self.rows and 0 <= coord.col < self.cols
 
 
-class PathFinder:
+class JunctionGraph:
     def __init__(self, grid: Grid) -> None:
+        # junctions are the start, the end and every cell with three or more open neighbours;
+        # edges follow the corridors between them, weighted by length, and are one-way where a
+        # slope can only be entered in one direction
         self.grid = grid
-        self.pos = grid.start
-        self.dirs = []
-
-    def find_longest_path(self) -> int:
-        self.pos = self.grid.start
-        self.grid[self.pos.row][self.pos.col] = Content.START
-        max_length = 0
-        while self.advance():
-            if self.pos == self.grid.end:
-                if args.verbose:
-                    print(f'found path of length {self.length()}')
-                    print(self.grid)
-                max_length = max(max_length, self.length())
-        return max_length
-
-    def advance(self, dir_hint: Optional[Direction] = None) -> bool:
-        while True:
-            for dir in Direction.values(dir_hint):
-                next = dir.next(self.pos)
-                if self.grid.inbounds(next) and self.grid[next.row][next.col].can_enter(dir):
-                    if self.grid[next.row][next.col] == Content.EMPTY:
-                        self.grid[next.row][next.col] = Content.PATH
-                    self.pos = next
-                    self.dirs.append(dir)
-                    if args.debug:
-                        print(f'advance {dir} to {self.pos}')
-                        print(self.grid)
-                    return True
+        self.junctions = [grid.start, grid.end] + [
+            Coordinate(row, col)
+            for row in range(grid.rows)
+            for col in range(grid.cols)
+            if grid[row][col] != Content.WALL and len(self.open_neighbors(Coordinate(row, col))) >= 3
+        ]
+        self.index = {junction: i for i, junction in enumerate(self.junctions)}
+        self.edges = [self.corridors(junction) for junction in self.junctions]
+
+    def open_neighbors(self, coord: Coordinate) -> List[Direction]:
+        return [
+            dir for dir in Direction
+            if self.grid.inbounds(dir.next(coord)) and self.grid[dir.next(coord).row][dir.next(coord).col] != Content.WALL
+        ]
+
+    def corridors(self, junction: Coordinate) -> List[Tuple[int, int]]:
+        edges = []
+        for dir in self.open_neighbors(junction):
+            pos = junction
+            length = 0
             while True:
-                last = self.retreat()
-                if last is None:
-                    return False
-                dir_hint = last.succ()
-                if dir_hint is not None:
+                next = dir.next(pos)
+                if not self.grid[next.row][next.col].can_enter(dir):
+                    break
+                pos = next
+                length += 1
+                if pos in self.index:
+                    edges.append((self.index[pos], length))
                     break
+                onward = [d for d in self.open_neighbors(pos) if d != dir.reverse()]
+                if len(onward) != 1:
+                    break
+                dir = onward[0]
+        return edges
 
-    def retreat(self) -> Direction:
-        if len(self.dirs) == 0:
-            return None
-        last = self.dirs.pop()
-        if last is not None:
-            if self.grid[self.pos.row][self.pos.col] == Content.PATH:
-                self.grid[self.pos.row][self.pos.col] = Content.EMPTY
-            self.pos = last.reverse().next(self.pos)
-            if args.debug:
-                print(f'retreat {last.reverse()} to {self.pos}')
-        return last
+    def __str__(self) -> str:
+        return '\n'.join(
+            f'{junction}: {", ".join(f"{self.junctions[j]}={length}" for j, length in edges)}'
+            for junction, edges in zip(self.junctions, self.edges)
+        )
+
+
+class Profile:
+    def __init__(self) -> None:
+        self.expanded = 0
+        self.prunes = 0
+
+    def __str__(self) -> str:
+        return f'expanded: {self.expanded}, prunes: {self.prunes}'
+
+profile = Profile()
 
-    def length(self):
-        return len(self.dirs)
 
+class PathFinder:
+    START = 0
+    END = 1
 
-map = Grid.parsefrom(sys.stdin, Content)
-if args.debug:
-    print(map)
+    def __init__(self, grid: Grid) -> None:
+        self.grid = grid
+        self.graph = JunctionGraph(grid)
+        self.bound = args.prune in ('bound', 'reach', 'all')
+        self.reach = args.prune in ('reach', 'all')
+        # the longest edge into each junction; a path can still gain at most the sum of these over
+        # the junctions it has not visited yet
+        self.max_in = [0] * len(self.graph.junctions)
+        for edges in self.graph.edges:
+            for next, length in edges:
+                self.max_in[next] = max(self.max_in[next], length)
+        # (junction, bit, length) per edge, longest first so good paths are found early and bound
+        # the rest; visited junctions are kept as bits of an int
+        self.exits = [
+            sorted([(next, 1 << next, length) for next, length in edges], key=lambda exit: -exit[2])
+            for edges in self.graph.edges
+        ]
+        if args.prune in ('exit', 'all'):
+            # the end is a dead end off a single junction, so once there, leaving any other way
+            # can never reach the end
+            into_end = [i for i, edges in enumerate(self.graph.edges) if any(next == PathFinder.END for next, _ in edges)]
+            if len(into_end) == 1:
+                self.exits[into_end[0]] = [
+                    (next, bit, length) for next, bit, length in self.exits[into_end[0]] if next == PathFinder.END]
+        self.neighbors = [sum(1 << next for next, _ in edges) for edges in self.graph.edges]
+        self.best = None
 
-pathfinder = PathFinder(map)
-print(pathfinder.find_longest_path())
+    def find_longest_path(self) -> int:
+        if args.verbose:
+            print(f'{len(self.graph.junctions)} junctions, {sum(len(edges) for edges in self.graph.edges)} edges')
+        if args.debug:
+            print(self.graph)
+        self.best = None
+        if args.jobs > 1:
+            self.search_parallel()
+        else:
+            self.search(*self.root())
+        if self.best is None:
+            raise ValueError('No path from start to end')
+        return self.best
+
+    def root(self) -> Tuple[int, int, int, int]:
+        return (PathFinder.START, 1 << PathFinder.START, 0, sum(self.max_in) - self.max_in[PathFinder.START])
+
+    def prefixes(self, depth: int) -> List[Tuple[int, int, int, int]]:
+        # the search states `depth` moves below the root, each the root of an independent subtree;
+        # paths that reach the end sooner are kept as they are
+        frontier = [self.root()]
+        for _ in range(depth):
+            deeper = []
+            for state in frontier:
+                junction, visited, length, remaining = state
+                if junction == PathFinder.END:
+                    deeper.append(state)
+                    continue
+                for next, bit, edge in self.exits[junction]:
+                    if not visited & bit:
+                        deeper.append((next, visited | bit, length + edge, remaining - self.max_in[next]))
+            frontier = deeper
+        return frontier
+
+    def warm_up(self, budget: int) -> Optional[int]:
+        # the serial search's order, longest exit first, cut off after `budget` states; good paths
+        # turn up early in that order, and any real path bounds every subtree from the start
+        best = None
+        stack = [(PathFinder.START, 1 << PathFinder.START, 0)]
+        while stack and budget > 0:
+            junction, visited, length = stack.pop()
+            budget -= 1
+            profile.expanded += 1
+            if junction == PathFinder.END:
+                if best is None or length > best:
+                    best = length
+                continue
+            bound = self.reachable_bound(junction, visited)
+            if bound is None or (best is not None and length + bound <= best):
+                profile.prunes += 1
+                continue
+            for next, bit, edge in reversed(self.exits[junction]):
+                if not visited & bit:
+                    stack.append((next, visited | bit, length + edge))
+        return best
+
+    def search_parallel(self) -> None:
+        self.best = self.warm_up(args.warm_up)
+        if args.verbose:
+            print(f'warm-up found a path of length {self.best}')
+        # subtrees that can no longer reach the end or beat the warm-up path are dropped here; the
+        # rest go out with the most reachable junctions first, so the largest start soonest
+        subtrees = []
+        for state in self.prefixes(args.split_depth):
+            junction, visited, length, _ = state
+            reach = self.reachable(junction, visited) | 1 << junction
+            bound = self.reachable_bound(junction, visited) if junction != PathFinder.END else 0
+            if self.bound and (bound is None or (self.best is not None and length + bound <= self.best)):
+                profile.prunes += 1
+                continue
+            subtrees.append((reach.bit_count(), length + (bound or 0), state))
+        subtrees.sort(key=lambda subtree: subtree[:2], reverse=True)
+        if args.verbose:
+            print(f'{len(subtrees)} subtrees at depth {args.split_depth}')
+        # workers share the best length found so far, picking it up before each subtree and raising
+        # it after
+        shared_best = multiprocessing.Value('q', -1 if self.best is None else self.best)
+        initargs = (args, self.grid, shared_best)
+        with multiprocessing.Pool(args.jobs, initializer=init_worker, initargs=initargs) as pool:
+            states = [state for _, _, state in subtrees]
+            for best, expanded, prunes in pool.imap_unordered(search_subtree, states):
+                if best is not None and (self.best is None or best > self.best):
+                    self.best = best
+                profile.expanded += expanded
+                profile.prunes += prunes
+
+    def search(self, junction: int, visited: int, length: int, remaining: int) -> None:
+        profile.expanded += 1
+        if junction == PathFinder.END:
+            if self.best is None or length > self.best:
+                self.best = length
+                if args.verbose:
+                    print(f'found path of length {length}')
+            return
+        if self.bound and self.best is not None:
+            if length + remaining <= self.best:
+                profile.prunes += 1
+                return
+            if self.reach:
+                bound = self.reachable_bound(junction, visited)
+                if bound is None or length + bound <= self.best:
+                    profile.prunes += 1
+                    return
+        for next, bit, edge in self.exits[junction]:
+            if visited & bit:
+                continue
+            self.search(next, visited | bit, length + edge, remaining - self.max_in[next])
+
+    def reachable(self, junction: int, visited: int) -> int:
+        # bits of the unvisited junctions still reachable from here
+        reach = 0
+        frontier = 1 << junction
+        while frontier:
+            low = frontier & -frontier
+            frontier ^= low
+            new = self.neighbors[low.bit_length() - 1] & ~visited & ~reach
+            reach |= new
+            frontier |= new
+        return reach
+
+    def reachable_bound(self, junction: int, visited: int) -> Optional[int]:
+        # like the remaining sum, but only over unvisited junctions still reachable from here;
+        # None once the end is cut off
+        reach = self.reachable(junction, visited)
+        if not reach >> PathFinder.END & 1:
+            return None
+        bound = 0
+        while reach:
+            low = reach & -reach
+            reach ^= low
+            bound += self.max_in[low.bit_length() - 1]
+        return bound
+
+
+def init_worker(worker_args: argparse.Namespace, grid: Grid, worker_best: multiprocessing.Value) -> None:
+    global args, pathfinder, shared_best
+    args = worker_args
+    pathfinder = PathFinder(grid)
+    shared_best = worker_best
+
+def search_subtree(state: Tuple[int, int, int, int]) -> Tuple[Optional[int], int, int]:
+    # any real path bounds the search, so each subtree starts from the better of this worker's
+    # best and the best shared by all workers
+    if shared_best.value >= 0 and (pathfinder.best is None or shared_best.value > pathfinder.best):
+        pathfinder.best = shared_best.value
+    profile.expanded = profile.prunes = 0
+    pathfinder.search(*state)
+    if pathfinder.best is not None:
+        with shared_best.get_lock():
+            if pathfinder.best > shared_best.value:
+                shared_best.value = pathfinder.best
+    return (pathfinder.best, profile.expanded, profile.prunes)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument('--verbose', action='store_true')
+    parser.add_argument('--part2', action='store_true')
+    parser.add_argument('--steps', type=int, default=1)
+    parser.add_argument('--prune', choices=['none', 'exit', 'bound', 'reach', 'all'],
+                        help='forced exit moves, bound on unvisited or on reachable junctions, or exit and reach together')
+    parser.add_argument('--profile', action='store_true', help='print expanded and pruned search states to stderr')
+    parser.add_argument('--jobs', type=int, help='number of worker processes searching subtrees in parallel')
+    parser.add_argument('--split-depth', type=int, dest='split_depth',
+                        help='moves from the start at which the search is split into subtrees for the workers')
+    parser.add_argument('--warm-up', type=int, dest='warm_up',
+                        help='states searched before splitting, to find a path that bounds every subtree')
+    parser.set_defaults(debug=False, verbose=False, part2=False, prune='all', profile=False, jobs=1, split_depth=6,
+                        warm_up=10000)
+    args = parser.parse_args()
+
+    map = Grid.parsefrom(sys.stdin, Content)
+    if args.debug:
+        print(map)
+
+    pathfinder = PathFinder(map)
+    print(pathfinder.find_longest_path())
+    if args.profile:
+        print(profile, file=sys.stderr)